@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+
+from scheduler import TIMEFRAME_SECONDS
+
+# هر صرافی فقط ماژول ربات خودش را بارگذاری می‌کند
+EXCHANGE_MODULES = {
+    'bybit': 'trade',
+    'bitunix': 'index',
+}
+DEFAULT_CONFIG_PATHS = {
+    'trade': os.path.join('config', 'bybit.json'),
+    'index': os.path.join('config', 'bitunix.json'),
+}
+DEFAULTS = {
+    'timeframe': '15m',
+    'base_risk_percent': 0.20,
+    'leverage': 5,
+    'max_open_positions': 2,
+    'position_value': 20,
+    'min_order_sizes': {},
+    'settle_offset': 2.0,
+    'max_concurrent_jobs': 4,
+    'log_file': 'trading_bot_detailed.log',
+}
+CONFIG_KEYS = {'exchange', 'symbols', 'schedule'} | set(DEFAULTS)
+SCHEDULE_KEYS = {'name', 'symbols', 'timeframe'}
+
+def _require(condition, message):
+    if not condition:
+        logging.error(f"[CONFIG] {message}")
+        raise ValueError(message)
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+def _unknown_keys(mapping, allowed):
+    return ', '.join(sorted(str(key) for key in mapping if key not in allowed))
+
+def _is_timeframe(value):
+    return isinstance(value, str) and value in TIMEFRAME_SECONDS
+
+def validate_config(config):
+    # کلید ناشناخته (مثلاً غلط املایی) نباید بی‌صدا با مقدار پیش‌فرض جایگزین شود
+    _require(not _unknown_keys(config, CONFIG_KEYS), f"Unknown config keys: {_unknown_keys(config, CONFIG_KEYS)}")
+    _require(isinstance(config.get('exchange'), str) and config['exchange'] in EXCHANGE_MODULES,
+             f"exchange must be one of {sorted(EXCHANGE_MODULES)}, got {config.get('exchange')!r}")
+
+    symbols = config.get('symbols')
+    _require(isinstance(symbols, list) and symbols and all(isinstance(s, str) and s for s in symbols),
+             "symbols must be a non-empty list of strings")
+    _require(_is_timeframe(config['timeframe']), f"Unsupported timeframe: {config['timeframe']!r}")
+
+    _require(_is_number(config['base_risk_percent']) and 0 < config['base_risk_percent'] <= 1,
+             "base_risk_percent must be in (0, 1]")
+    _require(_is_positive_int(config['leverage']), "leverage must be a positive integer")
+    _require(_is_positive_int(config['max_open_positions']),
+             "max_open_positions must be a positive integer")
+    _require(_is_number(config['position_value']) and config['position_value'] > 0, "position_value must be positive")
+    _require(_is_number(config['settle_offset']) and config['settle_offset'] >= 0, "settle_offset must be >= 0")
+    _require(_is_positive_int(config['max_concurrent_jobs']),
+             "max_concurrent_jobs must be a positive integer")
+
+    min_order_sizes = config['min_order_sizes']
+    _require(isinstance(min_order_sizes, dict), "min_order_sizes must be a mapping of symbol to size")
+    for symbol, size in min_order_sizes.items():
+        _require(symbol in symbols, f"min_order_sizes has unknown symbol {symbol}")
+        _require(_is_number(size) and size > 0, f"min_order_sizes[{symbol}] must be positive")
+
+    schedule = config['schedule']
+    _require(isinstance(schedule, list) and schedule, "schedule must be a non-empty list")
+    names = set()
+    for group in schedule:
+        _require(isinstance(group, dict) and isinstance(group.get('name'), str) and group['name'],
+                 "every schedule entry needs a name")
+        _require(group['name'] not in names, f"Duplicate schedule name: {group['name']}")
+        names.add(group['name'])
+        _require(not _unknown_keys(group, SCHEDULE_KEYS),
+                 f"Unknown keys in schedule {group['name']}: {_unknown_keys(group, SCHEDULE_KEYS)}")
+        _require(_is_timeframe(group.get('timeframe')),
+                 f"Unsupported timeframe in schedule {group['name']}: {group.get('timeframe')!r}")
+        group_symbols = group.get('symbols')
+        _require(isinstance(group_symbols, list) and group_symbols,
+                 f"schedule {group['name']} needs a non-empty symbols list")
+        for symbol in group_symbols:
+            _require(symbol in symbols, f"schedule {group['name']} has unknown symbol {symbol}")
+
+    # تاخیر باید از کوتاه‌ترین کندل کمتر باشد، وگرنه کار یک کندل کامل دیرتر اجرا می‌شود
+    shortest = min(TIMEFRAME_SECONDS[group['timeframe']] for group in schedule)
+    _require(config['settle_offset'] < shortest,
+             f"settle_offset must be smaller than the shortest scheduled timeframe ({shortest}s)")
+    return config
+
+def load_config(path):
+    with open(path, encoding='utf-8') as f:
+        try:
+            raw = json.load(f)
+        except ValueError as e:
+            logging.error(f"[CONFIG] Invalid JSON in {path}: {str(e)}")
+            raise ValueError(f"Invalid JSON in {path}: {str(e)}")
+    _require(isinstance(raw, dict), f"{path} must contain a JSON object")
+
+    config = dict(DEFAULTS, **raw)
+    if 'schedule' not in raw and isinstance(config.get('symbols'), list):
+        config['schedule'] = [{'name': 'default', 'symbols': config['symbols'], 'timeframe': config['timeframe']}]
+    return validate_config(config)
+
+def setup_logging(config, stream=None):
+    # تنظیم لاگ با جزئیات کامل؛ با stream (مثلاً در --check) فایل لاگ دست نمی‌خورد
+    target = {'stream': stream} if stream is not None else {'filename': config['log_file']}
+    logging.basicConfig(
+        **target,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def bot_module_name(config):
+    return EXCHANGE_MODULES[config['exchange']]
@@ -0,0 +1,2 @@
+# test.py و test_ohlcv.py اسکریپت‌های دستی هستند که به API واقعی وصل می‌شوند
+collect_ignore = ['test.py', 'test_ohlcv.py']
@@ -1,54 +1,81 @@
-import ccxt
 import time
-import pandas as pd
-from ta.trend import EMAIndicator, ADXIndicator
-from ta.momentum import RSIIndicator
-from ta.volatility import AverageTrueRange
 import logging
+import threading
 import os
-from dotenv import load_dotenv
 import uuid
+from scheduler import create_scheduler, register_job, run_scheduler
+from config import load_config, setup_logging, DEFAULT_CONFIG_PATHS
 
-# تنظیم لاگ با جزئیات کامل
-logging.basicConfig(
-    filename='trading_bot_detailed.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# بارگذاری کلیدهای API از فایل .env
-load_dotenv()
-api_key = os.getenv('API_KEY')
-api_secret = os.getenv('API_SECRET')
-if not api_key or not api_secret:
-    logging.error("API key or secret not found in environment variables")
-    raise ValueError("API key or secret not found")
+# ccxt، pandas و ta سنگین هستند و فقط هنگام نیاز بارگذاری می‌شوند.
+# مقادیر زیر توسط configure() و connect() پر می‌شوند.
+api_key = None
+api_secret = None
+exchange = None
 
-# تنظیمات صرافی
-exchange = ccxt.bitunix({
-    'apiKey': api_key,
-    'secret': api_secret,
-    'enableRateLimit': True,
-    'options': {'defaultType': 'future'},
-})
-
-symbols = ['ETH/USDT', 'DOT/USDT', 'DOGE/USDT', 'XRP/USDT']
+symbols = []
 timeframe = '15m'
 base_risk_percent = 0.20  # ریسک پایه 20%
 leverage = 5
 max_open_positions = 2
 position_value = 20  # ارزش پوزیشن 20 دلار (4 دلار ریسک با اهرم 5x)
-min_order_sizes = {
-    'ETH/USDT': 0.004,  # ~10 دلار با قیمت 2500 دلار
-    'DOT/USDT': 1.0,    # ~5 دلار با قیمت 5 دلار
-    'DOGE/USDT': 60.0,  # ~6 دلار با قیمت 0.1 دلار
-    'XRP/USDT': 2.0     # ~1 دلار با قیمت 0.5 دلار
-}
-
-def fetch_ohlcv_with_retry(symbol, max_retries=3):
+min_order_sizes = {}
+# هر گروه نمادها در تایم‌فریم خودش بعد از بسته شدن کندل اجرا می‌شود
+schedule = []
+settle_offset = 2.0  # ثانیه بعد از بسته شدن کندل
+max_concurrent_jobs = 4
+order_lock = threading.Lock()
+
+def configure(config):
+    global symbols, timeframe, base_risk_percent, leverage, max_open_positions, position_value
+    global min_order_sizes, schedule, settle_offset, max_concurrent_jobs
+    symbols = list(config['symbols'])
+    timeframe = config['timeframe']
+    base_risk_percent = config['base_risk_percent']
+    leverage = config['leverage']
+    max_open_positions = config['max_open_positions']
+    position_value = config['position_value']
+    min_order_sizes = dict(config['min_order_sizes'])
+    schedule = [dict(group) for group in config['schedule']]
+    settle_offset = config['settle_offset']
+    max_concurrent_jobs = config['max_concurrent_jobs']
+
+# تنظیمات صرافی
+def create_exchange(key, secret):
+    import ccxt
+
+    return ccxt.bitunix({
+        'apiKey': key,
+        'secret': secret,
+        'enableRateLimit': True,
+        'options': {'defaultType': 'future'},
+    })
+
+def connect(key, secret):
+    global api_key, api_secret, exchange
+    api_key = key
+    api_secret = secret
+    exchange = create_exchange(key, secret)
+
+def init(config):
+    setup_logging(config)
+    configure(config)
+
+    # بارگذاری کلیدهای API از فایل .env
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    key = os.getenv('API_KEY')
+    secret = os.getenv('API_SECRET')
+    if not key or not secret:
+        logging.error("API key or secret not found in environment variables")
+        raise ValueError("API key or secret not found")
+    connect(key, secret)
+
+def fetch_ohlcv_with_retry(symbol, max_retries=3, tf=None):
+    tf = tf or timeframe
     for i in range(max_retries):
         try:
-            data = exchange.fetch_ohlcv(symbol, timeframe, limit=100)
+            data = exchange.fetch_ohlcv(symbol, tf, limit=100)
             logging.info(f"[OHLCV] Successfully fetched OHLCV data for {symbol}: {len(data)} candles")
             return data
         except Exception as e:
@@ -74,12 +101,22 @@ def adjust_risk_percent(atr, adx, price, base_risk=0.20):
     logging.info(f"[RISK] Adjusted risk: {risk*100:.1f}% (ATR: {atr:.2f}, ADX: {adx:.2f})")
     return risk
 
-def generate_signal(df, symbol):
+def compute_indicators(df):
+    from ta.trend import EMAIndicator, ADXIndicator
+    from ta.momentum import RSIIndicator
+    from ta.volatility import AverageTrueRange
+
     df['ema_short'] = EMAIndicator(df['close'], window=12).ema_indicator()
     df['ema_long'] = EMAIndicator(df['close'], window=26).ema_indicator()
     df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
     df['adx'] = ADXIndicator(df['high'], df['low'], df['close'], window=14).adx()
     df['atr'] = AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range()
+    return df
+
+def generate_signal(df, symbol):
+    # اندیکاتورها ممکن است قبلا توسط فرایند داده بازار محاسبه شده باشند
+    if 'atr' not in df.columns:
+        compute_indicators(df)
 
     last = df.iloc[-1]
     prev = df.iloc[-2]
@@ -219,15 +256,22 @@ def place_order(symbol, signal, price, atr, adx, support, resistance):
         logging.error(f"[ORDER] Failed to place order for {symbol}: {str(e)}")
         return None
 
-def select_best_signals():
+def fetch_candles(symbol, tf=None):
+    ohlcv = fetch_ohlcv_with_retry(symbol, tf=tf)
+    if ohlcv is None:
+        return None
+    import pandas as pd
+
+    return pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+def select_best_signals(group_symbols=None, tf=None, frames=None):
     signals = []
-    for symbol in symbols:
+    for symbol in group_symbols or symbols:
         try:
-            ohlcv = fetch_ohlcv_with_retry(symbol)
-            if ohlcv is None:
+            df = frames.get(symbol) if frames is not None else fetch_candles(symbol, tf)
+            if df is None:
                 continue
 
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             signal_data = generate_signal(df, symbol)
             if signal_data:
                 signal_data['symbol'] = symbol
@@ -242,45 +286,53 @@ def select_best_signals():
     # انتخاب حداکثر دو سیگنال برتر
     return signals[:max_open_positions]
 
-def sync_with_candle():
-    current_time = time.time()
-    candle_duration = 15 * 60
-    sleep_time = candle_duration - (current_time % candle_duration)
-    logging.info(f"[SYNC] Waiting {sleep_time:.0f}s for next candle")
-    time.sleep(sleep_time)
-
-def run_bot():
+def run_cycle(group_symbols, tf, frames=None):
+    best_signals = select_best_signals(group_symbols, tf, frames)
+    if not best_signals:
+        logging.info(f"[WAITING] No valid signals for any symbol ({tf}).")
+        return
+    place_signals(best_signals, tf)
+
+def place_signals(best_signals, tf):
+    # جلوگیری از عبور از سقف پوزیشن‌ها وقتی چند تایم‌فریم هم‌زمان اجرا می‌شوند
+    with order_lock:
+        for signal_data in best_signals:
+            symbol = signal_data['symbol']
+            signal = signal_data['signal']
+            price = signal_data['price']
+            atr = signal_data['atr']
+            adx = signal_data['adx']
+            support = signal_data['support']
+            resistance = signal_data['resistance']
+
+            logging.info(f"[SIGNAL] {signal.upper()} for {symbol} at {price:.2f} ({tf}, ADX: {adx:.2f}, ATR: {atr:.2f})")
+            place_order(symbol, signal, price, atr, adx, support, resistance)
+
+def setup_account():
     try:
         for symbol in symbols:
             exchange.set_leverage(leverage, symbol)
             logging.info(f"[INIT] Leverage set to {leverage}x for {symbol}")
     except Exception as e:
         logging.error(f"[INIT] Failed to set leverage: {str(e)}")
-        return
-
-    while True:
-        sync_with_candle()
-        try:
-            best_signals = select_best_signals()
-            if not best_signals:
-                logging.info("[WAITING] No valid signals for any symbol.")
-                continue
-
-            for signal_data in best_signals:
-                symbol = signal_data['symbol']
-                signal = signal_data['signal']
-                price = signal_data['price']
-                atr = signal_data['atr']
-                adx = signal_data['adx']
-                support = signal_data['support']
-                resistance = signal_data['resistance']
+        return False
+    return True
 
-                logging.info(f"[SIGNAL] {signal.upper()} for {symbol} at {price:.2f} (ADX: {adx:.2f}, ATR: {atr:.2f})")
-                place_order(symbol, signal, price, atr, adx, support, resistance)
+def run_bot():
+    if not setup_account():
+        return
 
-        except Exception as e:
-            logging.error(f"[ERROR] Main loop: {str(e)}")
-            time.sleep(60)
+    scheduler = create_scheduler(server_time_fn=exchange.fetch_time, max_workers=max_concurrent_jobs)
+    for group in schedule:
+        register_job(
+            scheduler,
+            f"{group['name']}-{group['timeframe']}",
+            group['timeframe'],
+            lambda group=group: run_cycle(group['symbols'], group['timeframe']),
+            settle_offset=settle_offset,
+        )
+    run_scheduler(scheduler)
 
 if __name__ == "__main__":
+    init(load_config(DEFAULT_CONFIG_PATHS['index']))
     run_bot()
\ No newline at end of file
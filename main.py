@@ -0,0 +1,54 @@
+import time
+
+_started = time.perf_counter()
+
+import sys
+import logging
+import argparse
+import importlib
+
+from config import load_config, setup_logging, bot_module_name, DEFAULT_CONFIG_PATHS
+
+HEAVY_MODULES = ('ccxt', 'pandas', 'ta', 'requests', 'numpy')
+
+def report_startup(timings):
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    summary = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings)
+    total = sum(seconds for _, seconds in timings)
+    logging.info(f"[STARTUP] {summary}, total {total * 1000:.0f}ms (heavy modules loaded: {', '.join(loaded) or 'none'})")
+    return summary, total, loaded
+
+def main():
+    entry = time.perf_counter() - _started
+    parser = argparse.ArgumentParser(description='Run the trading bot')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATHS['trade'])
+    parser.add_argument('--check', action='store_true',
+                        help='validate the config and import the bot without connecting, then exit')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    config = load_config(args.config)
+    setup_logging(config, stream=sys.stderr if args.check else None)
+    config_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    module_name = bot_module_name(config)
+    bot = importlib.import_module(module_name)
+    import_time = time.perf_counter() - started
+
+    if args.check:
+        bot.configure(config)
+        summary, total, loaded = report_startup([('entry', entry), ('config', config_time), (module_name, import_time)])
+        print(f"Config OK: {args.config} ({config['exchange']}, {len(config['schedule'])} schedule groups)")
+        print(f"Startup: {summary}, total {total * 1000:.0f}ms")
+        print(f"Heavy modules loaded: {', '.join(loaded) or 'none'}")
+        return
+
+    started = time.perf_counter()
+    bot.init(config)
+    init_time = time.perf_counter() - started
+    report_startup([('entry', entry), ('config', config_time), (module_name, import_time), ('init', init_time)])
+    bot.run_bot()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+import io
+import time
+import json
+import logging
+import os
+import sys
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPResponse
+from urllib3.exceptions import ReadTimeoutError
+
+from config import load_config, setup_logging, bot_module_name, DEFAULT_CONFIG_PATHS
+
+REDACTED = '<REDACTED>'
+SENSITIVE_KEYS = {'apikey', 'api_key', 'secret', 'sign', 'signature', 'x-bapi-api-key', 'x-bapi-sign'}
+# فیلدهایی که در هر اجرا تغییر می‌کنند و نباید در تطبیق درخواست‌ها دخیل باشند
+VOLATILE_KEYS = {'timestamp', 'clientid', 'clientorderid', 'orderlinkid'}
+EXCHANGE_METHOD_PREFIXES = ('fetch_', 'create_', 'cancel_', 'set_', 'request')
+
+_real_sleep = time.sleep
+
+class ReplayMissError(Exception):
+    pass
+
+def redact(value, secrets=()):
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SENSITIVE_KEYS else redact(v, secrets) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v, secrets) for v in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            if secret:
+                value = value.replace(secret, REDACTED)
+    return value
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items()
+                if str(k).lower() not in VOLATILE_KEYS and str(k).lower() not in SENSITIVE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+def _match_key(interaction):
+    return json.dumps([interaction['kind'], interaction['method'], interaction.get('url'),
+                       _strip_volatile(interaction.get('request'))], sort_keys=True, default=str)
+
+def _loose_key(interaction):
+    return json.dumps([interaction['kind'], interaction['method'], interaction.get('url')])
+
+def _parse_body(data):
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    if isinstance(data, str):
+        try:
+            return json.loads(data)
+        except ValueError:
+            return data
+    return data
+
+def json_dumps(value):
+    return json.dumps(value, default=str)
+
+def load_cassette(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_cassette(path, interactions):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'interactions': interactions}, f, indent=2, default=str)
+    logging.info(f"[REPLAY] Saved {len(interactions)} interactions to {path}")
+
+def create_recorder(secrets=()):
+    return {'interactions': [], 'secrets': [s for s in secrets if s], 'lock': threading.Lock()}
+
+def record_interaction(recorder, interaction):
+    interaction = redact(interaction, recorder['secrets'])
+    with recorder['lock']:
+        recorder['interactions'].append(interaction)
+
+def create_player(cassette, speed=None, latency=0.0, faults=None):
+    # speed=None پاسخ‌ها را بدون تاخیر برمی‌گرداند، speed=1 با همان تاخیر ضبط‌شده
+    queues = {}
+    for interaction in cassette['interactions']:
+        queues.setdefault(_match_key(interaction), []).append(interaction)
+        queues.setdefault(_loose_key(interaction), []).append(interaction)
+    return {
+        'queues': queues,
+        'served': set(),
+        'speed': speed,
+        'latency': latency,
+        'faults': [dict(fault, hits=0) for fault in faults or []],
+        'calls': 0,
+        'history': [],
+        'lock': threading.Lock(),
+    }
+
+def _next_interaction(player, probe):
+    with player['lock']:
+        player['calls'] += 1
+        for key in (_match_key(probe), _loose_key(probe)):
+            queue = player['queues'].get(key)
+            if not queue:
+                continue
+            # هر تعامل یک بار مصرف می‌شود، چه از صف دقیق و چه از صف جایگزین؛
+            # وقتی صف تمام شد آخرین پاسخ تکرار می‌شود تا چرخه‌ها قابل تکرار باشند
+            interaction = next((i for i in queue if id(i) not in player['served']), queue[-1])
+            player['served'].add(id(interaction))
+            player['history'].append(probe)
+            return interaction
+    raise ReplayMissError(f"No recorded interaction for {probe['kind']} {probe['method']} {probe.get('url') or ''}")
+
+def _next_fault(player, target):
+    with player['lock']:
+        for fault in player['faults']:
+            if fault.get('match', '') not in target:
+                continue
+            if fault.get('times') is not None and fault['hits'] >= fault['times']:
+                continue
+            fault['hits'] += 1
+            return fault
+    return None
+
+def _delay(player, interaction, fault):
+    delay = player['latency'] + (fault.get('latency', 0.0) if fault else 0.0)
+    if player['speed'] and interaction is not None:
+        delay += interaction.get('elapsed', 0.0) / player['speed']
+    if delay > 0:
+        _real_sleep(delay)
+
+def _raise_recorded(interaction, module):
+    error = interaction['error']
+    error_class = getattr(module, error['type'], None)
+    if not (isinstance(error_class, type) and issubclass(error_class, Exception)):
+        error_class = Exception
+    raise error_class(error['message'])
+
+class RecordingSession(requests.Session):
+    def __init__(self, recorder):
+        super().__init__()
+        self.recorder = recorder
+
+    def request(self, method, url, params=None, data=None, json=None, **kwargs):
+        started = time.time()
+        interaction = {
+            'kind': 'http',
+            'method': method.upper(),
+            'url': url.split('?')[0],
+            'request': {'params': params, 'body': _parse_body(data) if json is None else json},
+        }
+        try:
+            response = super().request(method, url, params=params, data=data, json=json, **kwargs)
+        except requests.RequestException as e:
+            interaction.update(elapsed=time.time() - started, error={'type': type(e).__name__, 'message': str(e)})
+            record_interaction(self.recorder, interaction)
+            raise
+        interaction.update(elapsed=time.time() - started, status=response.status_code,
+                           response=_parse_body(response.content))
+        record_interaction(self.recorder, interaction)
+        return response
+
+class ReplayConnectionPool(HTTPConnectionPool):
+    # اتصالی باز نمی‌شود؛ پاسخ از کاست می‌آید ولی Retry خود urllib3 روی آن اجرا می‌شود
+    def __init__(self, scheme, host, port, player):
+        super().__init__(host, port)
+        self.replay_scheme = scheme
+        self.player = player
+
+    def _make_request(self, conn, method, url, body=None, headers=None, retries=None, timeout=None,
+                      chunked=False, response_conn=None, preload_content=True, decode_content=True,
+                      enforce_content_length=True):
+        path, _, query = url.partition('?')
+        full_url = f"{self.replay_scheme}://{self.host}{path}"
+
+        fault = _next_fault(self.player, full_url)
+        error = fault.get('error') if fault else None
+        if error is not None:
+            # خطای تزریقی پاسخ ضبط‌شده را مصرف نمی‌کند تا تلاش بعدی همان پاسخ را بگیرد
+            _delay(self.player, None, fault)
+            if error == 'timeout':
+                raise ReadTimeoutError(self, url, f"Injected timeout for {full_url}")
+            if error == 'connection':
+                raise ConnectionRefusedError(f"Injected connection error for {full_url}")
+            status = 429 if error == 'rate_limit' else int(error)
+            return self._replay_response(method, url, status, {'retCode': 10006, 'retMsg': 'Injected fault'},
+                                         response_conn, preload_content, decode_content)
+
+        probe = {
+            'kind': 'http',
+            'method': method.upper(),
+            'url': full_url,
+            'request': {'params': dict(parse_qsl(query)) or None, 'body': _parse_body(body)},
+        }
+        interaction = _next_interaction(self.player, probe)
+        _delay(self.player, interaction, fault)
+        if interaction.get('error'):
+            if 'Timeout' in interaction['error']['type']:
+                raise ReadTimeoutError(self, url, interaction['error']['message'])
+            raise ConnectionResetError(interaction['error']['message'])
+        return self._replay_response(method, url, interaction.get('status', 200), interaction.get('response'),
+                                     response_conn, preload_content, decode_content)
+
+    def _replay_response(self, method, url, status, body, response_conn, preload_content, decode_content):
+        content = (body if isinstance(body, str) else json_dumps(body)).encode('utf-8')
+        return HTTPResponse(
+            body=io.BytesIO(content),
+            headers={'Content-Type': 'application/json'},
+            status=status,
+            preload_content=preload_content,
+            decode_content=decode_content,
+            request_method=method,
+            request_url=url,
+            pool=self,
+            connection=response_conn,
+        )
+
+class ReplayAdapter(HTTPAdapter):
+    def __init__(self, player, max_retries=0):
+        self.player = player
+        self.replay_pools = {}
+        super().__init__(max_retries=max_retries)
+
+    def _replay_pool(self, url):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        if key not in self.replay_pools:
+            self.replay_pools[key] = ReplayConnectionPool(parsed.scheme, parsed.hostname, parsed.port, self.player)
+        return self.replay_pools[key]
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._replay_pool(request.url)
+
+    def get_connection(self, url, proxies=None):
+        return self._replay_pool(url)
+
+def create_replay_session(player, template):
+    # همان تنظیمات Retry نشست اصلی روی آداپتور replay سوار می‌شود
+    session = requests.Session()
+    for prefix, adapter in template.adapters.items():
+        session.mount(prefix, ReplayAdapter(player, max_retries=getattr(adapter, 'max_retries', 0)))
+    return session
+
+class RecordingExchange:
+    def __init__(self, exchange, recorder):
+        self._exchange = exchange
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if not callable(attr) or not name.startswith(EXCHANGE_METHOD_PREFIXES):
+            return attr
+
+        def call(*args, **kwargs):
+            started = time.time()
+            interaction = {'kind': 'ccxt', 'method': name, 'request': {'args': list(args), 'kwargs': kwargs}}
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                interaction.update(elapsed=time.time() - started, error={'type': type(e).__name__, 'message': str(e)})
+                record_interaction(self._recorder, interaction)
+                raise
+            interaction.update(elapsed=time.time() - started, response=json.loads(json_dumps(result)))
+            record_interaction(self._recorder, interaction)
+            return result
+        return call
+
+class ReplayExchange:
+    def __init__(self, player):
+        self._player = player
+
+    def __getattr__(self, name):
+        if not name.startswith(EXCHANGE_METHOD_PREFIXES):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            fault = _next_fault(self._player, name)
+            error = fault.get('error') if fault else None
+            if error is not None:
+                import ccxt
+
+                _delay(self._player, None, fault)
+                if error == 'timeout':
+                    raise ccxt.RequestTimeout(f"Injected timeout for {name}")
+                if error == 'connection':
+                    raise ccxt.NetworkError(f"Injected connection error for {name}")
+                if error == 'rate_limit':
+                    raise ccxt.RateLimitExceeded(f"Injected rate limit for {name}")
+                raise ccxt.ExchangeNotAvailable(f"Injected HTTP {error} for {name}")
+
+            probe = {'kind': 'ccxt', 'method': name, 'request': {'args': list(args), 'kwargs': kwargs}}
+            interaction = _next_interaction(self._player, probe)
+            _delay(self._player, interaction, fault)
+            if interaction.get('error'):
+                import ccxt
+
+                _raise_recorded(interaction, ccxt)
+            return json.loads(json_dumps(interaction.get('response')))
+        return call
+
+@contextmanager
+def scaled_sleep(factor):
+    # تاخیرهای retry/backoff ربات را کوتاه می‌کند و مجموع آن را گزارش می‌دهد
+    stats = {'requested': 0.0, 'calls': 0}
+
+    def sleep(seconds):
+        stats['requested'] += seconds
+        stats['calls'] += 1
+        if factor:
+            _real_sleep(seconds * factor)
+
+    time.sleep = sleep
+    try:
+        yield stats
+    finally:
+        time.sleep = _real_sleep
+
+@contextmanager
+def use_cassette(bot, path, mode='replay', speed=None, latency=0.0, faults=None):
+    original_exchange = bot.exchange
+    original_session = getattr(bot, 'create_session', None)
+
+    if mode == 'record':
+        recorder = create_recorder([getattr(bot, 'api_key', None), getattr(bot, 'api_secret', None)])
+        bot.exchange = RecordingExchange(original_exchange, recorder)
+        if original_session is not None:
+            def create_session():
+                session = RecordingSession(recorder)
+                for prefix, adapter in original_session().adapters.items():
+                    session.mount(prefix, adapter)
+                return session
+            bot.create_session = create_session
+        state = recorder
+    elif mode == 'replay':
+        player = create_player(load_cassette(path), speed=speed, latency=latency, faults=faults)
+        bot.exchange = ReplayExchange(player)
+        if original_session is not None:
+            bot.create_session = lambda: create_replay_session(player, original_session())
+        state = player
+    else:
+        raise ValueError(f"Unknown cassette mode: {mode}")
+
+    try:
+        yield state
+    finally:
+        bot.exchange = original_exchange
+        if original_session is not None:
+            bot.create_session = original_session
+        if mode == 'record':
+            save_cassette(path, state['interactions'])
+
+def run_cycles(bot, cycles=1):
+    durations = []
+    for _ in range(cycles):
+        started = time.perf_counter()
+        for group in bot.schedule:
+            bot.run_cycle(group['symbols'], group['timeframe'])
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def report(durations, sleep_stats=None):
+    durations = sorted(durations)
+    mean = sum(durations) / len(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"Cycles: {len(durations)}, Mean: {mean * 1000:.1f}ms, Min: {durations[0] * 1000:.1f}ms, "
+          f"P95: {p95 * 1000:.1f}ms, Max: {durations[-1] * 1000:.1f}ms")
+    if sleep_stats:
+        print(f"Bot sleeps: {sleep_stats['calls']} calls, {sleep_stats['requested']:.1f}s requested")
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or replay exchange traffic for a bot cycle')
+    parser.add_argument('mode', choices=['record', 'replay', 'bench'])
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATHS['trade'])
+    parser.add_argument('--cassette', default=None, help='defaults to fixtures/<bot module>_cycle.json')
+    parser.add_argument('--cycles', type=int, default=1)
+    parser.add_argument('--speed', type=float, default=None, help='replay speed relative to recording; omit for no delay')
+    parser.add_argument('--latency', type=float, default=0.0, help='extra latency in seconds added to every call')
+    parser.add_argument('--faults', default=None, help='JSON list of faults, e.g. [{"match": "kline", "error": 503, "times": 2}]')
+    parser.add_argument('--sleep-factor', type=float, default=0.0, help='scale for the bot\'s own time.sleep calls')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    bot = importlib.import_module(bot_module_name(config))
+    cassette = args.cassette or os.path.join('fixtures', f"{bot.__name__}_cycle.json")
+    faults = json.loads(args.faults) if args.faults else None
+    mode = 'record' if args.mode == 'record' else 'replay'
+    if mode == 'record':
+        bot.init(config)
+    else:
+        # در حالت replay به کلید واقعی و اتصال به صرافی نیازی نیست؛ لاگ‌های ساختگی به فایل لاگ ربات نمی‌روند
+        setup_logging(config, stream=sys.stderr)
+        bot.configure(config)
+        bot.api_key = bot.api_secret = 'replay'
+
+    with use_cassette(bot, cassette, mode, speed=args.speed, latency=args.latency, faults=faults):
+        with scaled_sleep(args.sleep_factor if mode == 'replay' else 1) as sleep_stats:
+            durations = run_cycles(bot, args.cycles)
+    report(durations, sleep_stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TIMEFRAME_SECONDS = {
+    '1m': 60,
+    '3m': 3 * 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 60 * 60,
+    '2h': 2 * 60 * 60,
+    '4h': 4 * 60 * 60,
+    '6h': 6 * 60 * 60,
+    '12h': 12 * 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+def timeframe_to_seconds(timeframe):
+    if timeframe not in TIMEFRAME_SECONDS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return TIMEFRAME_SECONDS[timeframe]
+
+def create_scheduler(server_time_fn=None, max_workers=4, drift_refresh=300, metrics_interval=900):
+    return {
+        'jobs': [],
+        'server_time_fn': server_time_fn,  # زمان سرور صرافی به میلی‌ثانیه
+        'clock_offset': 0.0,
+        'last_drift_check': None,
+        'drift_thread': None,
+        'drift_refresh': drift_refresh,
+        'metrics_interval': metrics_interval,
+        'last_metrics_log': time.time(),
+        'max_workers': max_workers,
+        'in_flight': 0,
+        'executor': ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job'),
+        'lock': threading.Lock(),
+    }
+
+def register_job(scheduler, name, timeframe, func, settle_offset=2.0, max_lateness=None):
+    period = timeframe_to_seconds(timeframe)
+    if not 0 <= settle_offset < period:
+        raise ValueError(f"settle_offset must be in [0, {period}) for {timeframe}, got {settle_offset}")
+    job = {
+        'name': name,
+        'timeframe': timeframe,
+        'period': period,
+        'func': func,
+        'settle_offset': settle_offset,
+        # کار باید قبل از این مدت (از زمان بسته شدن کندل + تاخیر) تمام شود
+        'max_lateness': max_lateness if max_lateness is not None else period / 2,
+        'next_run': None,
+        'running': False,
+        'metrics': {
+            'runs': 0,
+            'errors': 0,
+            'skipped': 0,
+            'missed_deadlines': 0,
+            'last_duration': 0.0,
+            'max_duration': 0.0,
+            'max_start_lag': 0.0,
+        },
+    }
+    scheduler['jobs'].append(job)
+    logging.info(f"[SCHED] Registered job {name} ({timeframe}, settle offset {settle_offset:.1f}s)")
+    return job
+
+def refresh_clock_offset(scheduler):
+    scheduler['last_drift_check'] = time.time()
+    if scheduler['server_time_fn'] is None:
+        return scheduler['clock_offset']
+    try:
+        sent = time.time()
+        server_ms = scheduler['server_time_fn']()
+        received = time.time()
+        offset = server_ms / 1000 - (sent + received) / 2
+        scheduler['clock_offset'] = offset
+        logging.info(f"[SCHED] Server clock offset: {offset * 1000:.0f}ms (round trip {(received - sent) * 1000:.0f}ms)")
+    except Exception as e:
+        logging.error(f"[SCHED] Failed to fetch server time, keeping offset {scheduler['clock_offset'] * 1000:.0f}ms: {str(e)}")
+    return scheduler['clock_offset']
+
+def _refresh_clock_offset_async(scheduler):
+    # درخواست زمان سرور در ترد جدا اجرا می‌شود تا تیک‌های موعد رسیده را عقب نیندازد
+    thread = scheduler['drift_thread']
+    if thread is not None and thread.is_alive():
+        return
+    scheduler['last_drift_check'] = time.time()
+    thread = threading.Thread(target=refresh_clock_offset, args=(scheduler,), name='clock-drift', daemon=True)
+    scheduler['drift_thread'] = thread
+    thread.start()
+
+def server_now(scheduler):
+    return time.time() + scheduler['clock_offset']
+
+def next_fire_time(job, now):
+    candle_open = now - (now % job['period'])
+    fire_time = candle_open + job['settle_offset']
+    if fire_time <= now:
+        fire_time += job['period']
+    return fire_time
+
+def get_metrics(scheduler):
+    with scheduler['lock']:
+        return {job['name']: dict(job['metrics']) for job in scheduler['jobs']}
+
+def log_metrics(scheduler):
+    for name, m in get_metrics(scheduler).items():
+        logging.info(f"[SCHED] {name} - Runs: {m['runs']}, Errors: {m['errors']}, Skipped: {m['skipped']}, "
+                     f"Missed deadlines: {m['missed_deadlines']}, Last: {m['last_duration']:.2f}s, "
+                     f"Max: {m['max_duration']:.2f}s, Max start lag: {m['max_start_lag']:.2f}s")
+
+def _run_job(scheduler, job, scheduled_time):
+    started = server_now(scheduler)
+    try:
+        job['func']()
+    except Exception as e:
+        with scheduler['lock']:
+            job['metrics']['errors'] += 1
+        logging.error(f"[SCHED] Job {job['name']} failed: {str(e)}")
+    finally:
+        finished = server_now(scheduler)
+        duration = finished - started
+        with scheduler['lock']:
+            metrics = job['metrics']
+            metrics['runs'] += 1
+            metrics['last_duration'] = duration
+            metrics['max_duration'] = max(metrics['max_duration'], duration)
+            if finished - scheduled_time > job['max_lateness']:
+                metrics['missed_deadlines'] += 1
+                logging.warning(f"[SCHED] Job {job['name']} missed its deadline: finished "
+                                f"{finished - scheduled_time:.2f}s after candle close (limit {job['max_lateness']:.2f}s)")
+            job['running'] = False
+            scheduler['in_flight'] -= 1
+
+def _dispatch(scheduler, job, now):
+    scheduled_time = job['next_run']
+    with scheduler['lock']:
+        metrics = job['metrics']
+        metrics['max_start_lag'] = max(metrics['max_start_lag'], now - scheduled_time)
+        if job['running'] or scheduler['in_flight'] >= scheduler['max_workers']:
+            # فشار برگشتی: تیک را رد می‌کنیم تا صف کارها انباشته نشود
+            reason = 'previous run still active' if job['running'] else 'all workers busy'
+            metrics['skipped'] += 1
+            logging.warning(f"[SCHED] Skipping tick for {job['name']}: {reason}")
+            return False
+        job['running'] = True
+        scheduler['in_flight'] += 1
+    try:
+        scheduler['executor'].submit(_run_job, scheduler, job, scheduled_time)
+    except Exception as e:
+        with scheduler['lock']:
+            job['running'] = False
+            scheduler['in_flight'] -= 1
+        logging.error(f"[SCHED] Failed to submit job {job['name']}: {str(e)}")
+        return False
+    return True
+
+def run_scheduler(scheduler, stop_event=None):
+    if not scheduler['jobs']:
+        raise ValueError("No jobs registered")
+    stop_event = stop_event or threading.Event()
+
+    refresh_clock_offset(scheduler)
+    now = server_now(scheduler)
+    for job in scheduler['jobs']:
+        job['next_run'] = next_fire_time(job, now)
+        logging.info(f"[SYNC] {job['name']} first run in {job['next_run'] - now:.0f}s")
+
+    try:
+        while not stop_event.is_set():
+            if time.time() - scheduler['last_drift_check'] >= scheduler['drift_refresh']:
+                _refresh_clock_offset_async(scheduler)
+            if time.time() - scheduler['last_metrics_log'] >= scheduler['metrics_interval']:
+                scheduler['last_metrics_log'] = time.time()
+                log_metrics(scheduler)
+
+            now = server_now(scheduler)
+            for job in scheduler['jobs']:
+                if job['next_run'] > now:
+                    continue
+                _dispatch(scheduler, job, now)
+                missed_ticks = int((now - job['next_run']) // job['period'])
+                if missed_ticks:
+                    with scheduler['lock']:
+                        job['metrics']['skipped'] += missed_ticks
+                    logging.warning(f"[SCHED] {job['name']} fell behind by {missed_ticks} candle(s)")
+                job['next_run'] = next_fire_time(job, now)
+
+            wait = min(job['next_run'] for job in scheduler['jobs']) - server_now(scheduler)
+            stop_event.wait(min(max(wait, 0), scheduler['drift_refresh']))
+    finally:
+        scheduler['executor'].shutdown(wait=True)
+        log_metrics(scheduler)
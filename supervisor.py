@@ -0,0 +1,266 @@
+import time
+import logging
+import os
+import argparse
+import importlib
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from scheduler import create_scheduler, register_job, run_scheduler
+from config import load_config, setup_logging, bot_module_name, DEFAULT_CONFIG_PATHS
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'ema_short', 'ema_long', 'rsi', 'adx', 'atr']
+CANDLE_LIMIT = 100
+MAX_RESTART_DELAY = 60
+STABLE_RUN_SECONDS = 600
+
+# چیدمان حافظه مشترک (دو بافر برای خواندن بدون کپی):
+#   header: [seq, writing, rows(buffer 0, block 0..n-1), rows(buffer 1, block 0..n-1)]
+#   data:   float64[2, n_blocks, CANDLE_LIMIT, len(COLUMNS)]
+# نویسنده قبل از نوشتن writing = seq + 1 را ثبت می‌کند، در بافر writing % 2 می‌نویسد و سپس seq = writing.
+# بافر فعال همیشه seq % 2 است.
+SEQ = 0
+WRITING = 1
+HEADER_FIELDS = 2
+
+def build_layout(config):
+    layout = []
+    for group in config['schedule']:
+        for symbol in group['symbols']:
+            if (group['timeframe'], symbol) not in layout:
+                layout.append((group['timeframe'], symbol))
+    return layout
+
+def shared_memory_size(n_blocks):
+    return (HEADER_FIELDS + 2 * n_blocks) * 8 + 2 * n_blocks * CANDLE_LIMIT * len(COLUMNS) * 8
+
+def attach_views(shm, n_blocks):
+    header = np.ndarray((HEADER_FIELDS + 2 * n_blocks,), dtype=np.int64, buffer=shm.buf)
+    data = np.ndarray((2, n_blocks, CANDLE_LIMIT, len(COLUMNS)), dtype=np.float64,
+                      buffer=shm.buf, offset=header.nbytes)
+    return header, data
+
+def _rows_index(n_blocks, buffer, block):
+    return HEADER_FIELDS + buffer * n_blocks + block
+
+def publish_frames(header, data, frames, lock, stale_blocks=()):
+    n_blocks = data.shape[1]
+    with lock:
+        seq = int(header[SEQ])
+        active, target = seq % 2, (seq + 1) % 2
+        # خواننده‌ای که هنوز بافر target را می‌خواند با دیدن این مقدار snapshot خود را رد می‌کند
+        header[WRITING] = seq + 1
+        data[target] = data[active]
+        header[_rows_index(n_blocks, target, 0):_rows_index(n_blocks, target, n_blocks)] = \
+            header[_rows_index(n_blocks, active, 0):_rows_index(n_blocks, active, n_blocks)]
+        for block, df in frames.items():
+            values = df[COLUMNS].to_numpy(dtype=np.float64)[-CANDLE_LIMIT:]
+            data[target, block, :len(values)] = values
+            header[_rows_index(n_blocks, target, block)] = len(values)
+        # نمادی که دریافت نشده منتشر نمی‌شود تا کندل قدیمی دوباره ارزیابی نشود
+        for block in stale_blocks:
+            header[_rows_index(n_blocks, target, block)] = 0
+        header[SEQ] = seq + 1
+    return seq + 1
+
+def read_frames(header, data, blocks):
+    import pandas as pd
+
+    n_blocks = data.shape[1]
+    seq = int(header[SEQ])
+    active = seq % 2
+    frames = {}
+    for symbol, block in blocks.items():
+        rows = int(header[_rows_index(n_blocks, active, block)])
+        if rows < 2:
+            continue
+        frames[symbol] = pd.DataFrame(data[active, block, :rows], columns=COLUMNS, copy=False)
+    return seq, frames
+
+def snapshot_is_valid(header, seq):
+    # نوشتن seq + 1 در بافر دیگر است؛ از seq + 2 به بعد بافری که خواندیم هدف نوشتن بوده است
+    return int(header[WRITING]) - seq < 2
+
+def load_accounts():
+    names = [name.strip() for name in os.getenv('ACCOUNTS', '').split(',') if name.strip()]
+    # بدون ACCOUNTS فقط حساب پیش‌فرض با API_KEY و API_SECRET اجرا می‌شود
+    prefixes = [(name, name.upper() + '_') for name in names] or [('default', '')]
+
+    accounts = []
+    for name, prefix in prefixes:
+        api_key = os.getenv(f'{prefix}API_KEY')
+        api_secret = os.getenv(f'{prefix}API_SECRET')
+        if not api_key or not api_secret:
+            logging.error(f"[SUPERVISOR] API key or secret not found for account {name}")
+            raise ValueError(f"API key or secret not found for account {name}")
+        accounts.append({'name': name, 'api_key': api_key, 'api_secret': api_secret})
+    return accounts
+
+def publish_group(bot, group, header, data, layout, lock):
+    frames = {}
+    stale_blocks = []
+    for symbol in group['symbols']:
+        block = layout.index((group['timeframe'], symbol))
+        df = bot.fetch_candles(symbol, group['timeframe'])
+        if df is None:
+            stale_blocks.append(block)
+            continue
+        frames[block] = bot.compute_indicators(df)
+    if not frames:
+        logging.error(f"[MARKET] No candles fetched for {group['name']} ({group['timeframe']})")
+        return
+    seq = publish_frames(header, data, frames, lock, stale_blocks)
+    logging.info(f"[MARKET] Published {len(frames)} symbols for {group['name']} ({group['timeframe']}), seq {seq}")
+
+def market_data_main(config, account, shm_name, layout):
+    # داده بازار با کلید اولین حساب گرفته می‌شود؛ API_KEY پیش‌فرض لازم نیست
+    setup_logging(config)
+    bot = importlib.import_module(bot_module_name(config))
+    bot.configure(config)
+    bot.connect(account['api_key'], account['api_secret'])
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header, data = attach_views(shm, len(layout))
+    lock = threading.Lock()
+
+    scheduler = create_scheduler(server_time_fn=bot.exchange.fetch_time, max_workers=bot.max_concurrent_jobs)
+    for group in bot.schedule:
+        register_job(
+            scheduler,
+            f"market-{group['name']}-{group['timeframe']}",
+            group['timeframe'],
+            lambda group=group: publish_group(bot, group, header, data, layout, lock),
+            settle_offset=bot.settle_offset,
+        )
+    run_scheduler(scheduler)
+
+def group_blocks(group, layout):
+    return {symbol: layout.index((group['timeframe'], symbol)) for symbol in group['symbols']}
+
+def latest_candle(frames):
+    return max((int(df['timestamp'].max()) for df in frames.values()), default=None)
+
+def account_worker_main(config, account, shm_name, layout, poll_interval):
+    setup_logging(config)
+    bot = importlib.import_module(bot_module_name(config))
+    bot.configure(config)
+    bot.connect(account['api_key'], account['api_secret'])
+    if not bot.setup_account():
+        logging.error(f"[WORKER {account['name']}] Account setup failed")
+        raise SystemExit(1)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header, data = attach_views(shm, len(layout))
+    groups = [(group, group_blocks(group, layout)) for group in bot.schedule]
+
+    # کندل‌هایی که قبل از شروع (یا راه‌اندازی مجدد) این ورکر منتشر شده‌اند دوباره معامله نمی‌شوند
+    last_candle = {}
+    for group, blocks in groups:
+        last_candle[group['name']] = latest_candle(read_frames(header, data, blocks)[1])
+    seen_seq = int(header[SEQ])
+    logging.info(f"[WORKER {account['name']}] Started (pid {os.getpid()})")
+
+    try:
+        while True:
+            if int(header[SEQ]) == seen_seq:
+                time.sleep(poll_interval)
+                continue
+            seen_seq = int(header[SEQ])
+
+            for group, blocks in groups:
+                seq, frames = read_frames(header, data, blocks)
+                candle = latest_candle(frames)
+                if candle is None or candle == last_candle[group['name']]:
+                    continue
+
+                best_signals = bot.select_best_signals(group['symbols'], group['timeframe'], frames)
+                if not snapshot_is_valid(header, seq):
+                    logging.warning(f"[WORKER {account['name']}] Snapshot for {group['name']} changed while reading, retrying")
+                    seen_seq = -1
+                    break
+                last_candle[group['name']] = candle
+                if not best_signals:
+                    logging.info(f"[WORKER {account['name']}] No valid signals for {group['name']} ({group['timeframe']}).")
+                    continue
+                bot.place_signals(best_signals, group['timeframe'])
+    except KeyboardInterrupt:
+        pass
+
+def start_process(ctx, spec):
+    process = ctx.Process(target=spec['target'], args=spec['args'], name=spec['name'], daemon=True)
+    process.start()
+    spec['process'] = process
+    spec['started'] = time.time()
+    logging.info(f"[SUPERVISOR] Started {spec['name']} (pid {process.pid})")
+
+def check_process(ctx, spec):
+    process = spec['process']
+    if process is not None and process.is_alive():
+        if spec['restarts'] and time.time() - spec['started'] > STABLE_RUN_SECONDS:
+            spec['restarts'] = 0
+        return
+
+    now = time.time()
+    if process is not None:
+        delay = min(MAX_RESTART_DELAY, 2 ** spec['restarts'])
+        logging.error(f"[SUPERVISOR] {spec['name']} exited with code {process.exitcode}, restarting in {delay}s")
+        spec['restarts'] += 1
+        spec['process'] = None
+        spec['next_start'] = now + delay
+    if now >= spec['next_start']:
+        start_process(ctx, spec)
+
+def run_supervisor(config, accounts, poll_interval=0.5):
+    ctx = mp.get_context('spawn')
+    layout = build_layout(config)
+
+    shm = shared_memory.SharedMemory(create=True, size=shared_memory_size(len(layout)))
+    header = attach_views(shm, len(layout))[0]
+    header[:] = 0
+    logging.info(f"[SUPERVISOR] Shared memory {shm.name}: {len(layout)} blocks, {shm.size} bytes, {len(accounts)} accounts")
+
+    specs = [{'name': 'market-data', 'target': market_data_main, 'args': (config, accounts[0], shm.name, layout)}]
+    for account in accounts:
+        specs.append({
+            'name': f"account-{account['name']}",
+            'target': account_worker_main,
+            'args': (config, account, shm.name, layout, poll_interval),
+        })
+    for spec in specs:
+        spec.update(process=None, restarts=0, started=0.0, next_start=0.0)
+
+    try:
+        while True:
+            for spec in specs:
+                check_process(ctx, spec)
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("[SUPERVISOR] Shutting down")
+    finally:
+        for spec in specs:
+            if spec['process'] is not None and spec['process'].is_alive():
+                spec['process'].terminate()
+        for spec in specs:
+            if spec['process'] is not None:
+                spec['process'].join(timeout=10)
+        del header  # نمای numpy باید قبل از بستن حافظه مشترک آزاد شود
+        shm.close()
+        shm.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run one market-data process and one worker per account')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATHS['trade'])
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(config)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    run_supervisor(config, load_accounts(), args.poll_interval)
+
+if __name__ == "__main__":
+    main()
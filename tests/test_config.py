@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from config import load_config, DEFAULT_CONFIG_PATHS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_config(tmp_path, **overrides):
+    with open(os.path.join(ROOT, DEFAULT_CONFIG_PATHS['trade']), encoding='utf-8') as f:
+        config = json.load(f)
+    config.update(overrides)
+    config['log_file'] = str(tmp_path / 'bot.log')
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+@pytest.mark.parametrize('path', sorted(DEFAULT_CONFIG_PATHS.values()))
+def test_shipped_configs_load(path):
+    config = load_config(os.path.join(ROOT, path))
+    assert config['schedule']
+
+
+def test_unknown_top_level_key_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='Unknown config keys: base_risk_pct'):
+        load_config(write_config(tmp_path, base_risk_pct=0.5))
+
+
+def test_unknown_schedule_key_is_rejected(tmp_path):
+    schedule = [{'name': 'eth', 'symbols': ['ETHUSDT'], 'timeframe': '15m', 'timefame': '1h'}]
+    with pytest.raises(ValueError, match='Unknown keys in schedule eth: timefame'):
+        load_config(write_config(tmp_path, schedule=schedule))
+
+
+@pytest.mark.parametrize('overrides', [
+    {'exchange': ['bybit']},
+    {'exchange': {'name': 'bybit'}},
+    {'timeframe': ['15m']},
+    {'schedule': [{'name': 'eth', 'symbols': ['ETHUSDT'], 'timeframe': ['15m']}]},
+])
+def test_unhashable_values_raise_value_error(tmp_path, overrides):
+    with pytest.raises(ValueError):
+        load_config(write_config(tmp_path, **overrides))
+
+
+def test_check_does_not_write_log_file(tmp_path):
+    path = write_config(tmp_path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--config', path, '--check'],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert 'Config OK' in result.stdout
+    assert '[STARTUP]' in result.stderr
+    assert not (tmp_path / 'bot.log').exists()
+
+
+def test_settle_offset_must_be_shorter_than_shortest_timeframe(tmp_path):
+    schedule = [{'name': 'eth', 'symbols': ['ETHUSDT'], 'timeframe': '15m'},
+                {'name': 'fast', 'symbols': ['ETHUSDT'], 'timeframe': '1m'}]
+    with pytest.raises(ValueError, match='shortest scheduled timeframe'):
+        load_config(write_config(tmp_path, schedule=schedule, settle_offset=90))
+    assert load_config(write_config(tmp_path, schedule=schedule, settle_offset=30))['settle_offset'] == 30
@@ -0,0 +1,240 @@
+import os
+import json
+import importlib
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('ta')
+pytest.importorskip('requests')
+
+import replay
+from config import load_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRADE_CASSETTE = os.path.join(ROOT, 'fixtures', 'trade_cycle.json')
+INDEX_CASSETTE = os.path.join(ROOT, 'fixtures', 'index_cycle.json')
+
+
+def load_bot(module_name, config_name):
+    bot = importlib.import_module(module_name)
+    bot.configure(load_config(os.path.join(ROOT, 'config', config_name)))
+    bot.api_key = bot.api_secret = 'replay'
+    return bot
+
+
+@pytest.fixture
+def trade():
+    return load_bot('trade', 'bybit.json')
+
+
+@pytest.fixture
+def index():
+    return load_bot('index', 'bitunix.json')
+
+
+def served(player):
+    return [probe.get('url', '').rsplit('/', 1)[-1] if probe['kind'] == 'http' else probe['method']
+            for probe in player['history']]
+
+
+def patched_cassette(tmp_path, path, method, response):
+    cassette = replay.load_cassette(path)
+    for interaction in cassette['interactions']:
+        if interaction['method'] == method:
+            interaction['response'] = response
+    patched = tmp_path / os.path.basename(path)
+    patched.write_text(json.dumps(cassette))
+    return str(patched)
+
+
+def signal_from_candles(bot, symbol, side='buy'):
+    df = bot.compute_indicators(bot.fetch_candles(symbol, '15m'))
+    last = df.iloc[-1]
+    support, resistance = bot.find_support_resistance(df)
+    return {'symbol': symbol, 'signal': side, 'price': last['close'], 'atr': last['atr'], 'adx': last['adx'],
+            'rsi': last['rsi'], 'support': support, 'resistance': resistance}
+
+
+def test_trade_cycle_replays_offline_without_orders(trade):
+    with replay.use_cassette(trade, TRADE_CASSETTE) as player, replay.scaled_sleep(0) as sleeps:
+        trade.run_cycle(trade.symbols, '15m')
+    assert served(player) == ['kline']
+    assert sleeps['calls'] == 0
+
+
+def test_index_cycle_replays_offline_without_orders(index):
+    with replay.use_cassette(index, INDEX_CASSETTE) as player, replay.scaled_sleep(0):
+        index.run_cycle(index.symbols, '15m')
+    assert served(player) == ['fetch_ohlcv'] * 4
+    assert [probe['request']['args'][0] for probe in player['history']] == index.symbols
+
+
+def test_trade_candles_are_oldest_first(trade):
+    with replay.use_cassette(trade, TRADE_CASSETTE), replay.scaled_sleep(0):
+        df = trade.fetch_candles('ETHUSDT', '15m')
+    # کست مثل بای‌بیت کندل‌ها را از جدید به قدیم برمی‌گرداند
+    assert df['timestamp'].is_monotonic_increasing
+    assert df['timestamp'].is_unique
+
+
+def test_trade_setup_account_replays(trade):
+    with replay.use_cassette(trade, TRADE_CASSETTE) as player:
+        trade.setup_account()
+    assert served(player) == ['set-leverage', 'demo-apply-money']
+
+
+def test_trade_place_signals_opens_position(trade):
+    with replay.use_cassette(trade, TRADE_CASSETTE) as player, replay.scaled_sleep(0):
+        signal = signal_from_candles(trade, 'ETHUSDT')
+        trade.place_signals([signal], '15m')
+
+    assert served(player) == ['kline', 'fetch_positions', 'fetch_positions', 'fetch_balance',
+                              'create_market_order', 'create_limit_order']
+    market, limit = player['history'][-2]['request']['kwargs'], player['history'][-1]['request']['kwargs']
+    amount = max(trade.min_order_sizes['ETHUSDT'], round(trade.position_value / signal['price'], 4))
+    assert market['side'] == 'buy'
+    assert market['amount'] == amount
+    assert float(market['params']['stopLossPrice']) < signal['price'] < float(market['params']['takeProfitPrice'])
+    assert limit['side'] == 'sell'
+    assert limit['amount'] == amount * 0.5
+    assert limit['params']['reduceOnly'] is True
+
+
+def test_trade_place_signals_skips_same_direction(trade, tmp_path):
+    cassette = patched_cassette(tmp_path, TRADE_CASSETTE, 'fetch_positions',
+                                [{'symbol': 'ETHUSDT', 'contracts': 0.008, 'side': 'long', 'id': None}])
+    with replay.use_cassette(trade, cassette) as player, replay.scaled_sleep(0):
+        trade.place_signals([signal_from_candles(trade, 'ETHUSDT')], '15m')
+    assert served(player) == ['kline', 'fetch_positions', 'fetch_positions']
+
+
+def test_index_place_signals_sends_batch_order(index):
+    with replay.use_cassette(index, INDEX_CASSETTE) as player, replay.scaled_sleep(0):
+        index.place_signals([signal_from_candles(index, 'ETH/USDT', side='sell')], '15m')
+
+    assert served(player)[1:] == ['fetch_positions', 'fetch_positions', 'fetch_balance', 'request']
+    method, path, payload = player['history'][-1]['request']['args']
+    assert (method, path, payload['symbol']) == ('POST', '/api/v1/futures/trade/batch_order', 'ETHUSDT')
+    assert [order['side'] for order in payload['orderList']] == ['SELL', 'BUY']
+    assert payload['orderList'][1]['reduceOnly'] is True
+
+
+def test_index_place_signals_skips_at_max_positions(index, tmp_path):
+    open_positions = [{'symbol': s, 'amount': 1.0, 'side': 'long'} for s in ('DOT/USDT', 'XRP/USDT')]
+    cassette = patched_cassette(tmp_path, INDEX_CASSETTE, 'fetch_positions', open_positions)
+    with replay.use_cassette(index, cassette) as player, replay.scaled_sleep(0):
+        index.place_signals([signal_from_candles(index, 'ETH/USDT')], '15m')
+    assert served(player)[1:] == ['fetch_positions']
+
+
+def low_balance_cassette(tmp_path, path):
+    return patched_cassette(tmp_path, path, 'fetch_balance', {'info': {}, 'free': {'USDT': 5.0}, 'total': {'USDT': 5.0}})
+
+
+def test_trade_balance_check_uses_configured_base_risk(trade, tmp_path):
+    trade.base_risk_percent = 1.0
+    with replay.use_cassette(trade, low_balance_cassette(tmp_path, TRADE_CASSETTE)) as player, replay.scaled_sleep(0):
+        trade.place_signals([signal_from_candles(trade, 'ETHUSDT')], '15m')
+    assert served(player) == ['kline', 'fetch_positions', 'fetch_positions', 'fetch_balance']
+
+
+def test_bot_retries_rate_limited_kline(trade):
+    faults = [{'match': 'kline', 'error': 'rate_limit', 'times': 2}]
+    with replay.use_cassette(trade, TRADE_CASSETTE, faults=faults) as player, replay.scaled_sleep(0) as sleeps:
+        data = trade.fetch_ohlcv_with_retry('ETHUSDT', tf='15m')
+    assert len(data) == 100
+    assert player['faults'][0]['hits'] == 2
+    # 429 در status_forcelist نیست، پس retry در خود ربات با backoff نمایی انجام می‌شود
+    assert sleeps['calls'] == 2
+    assert sleeps['requested'] == 1 + 2
+
+
+def test_urllib3_retry_handles_gateway_errors(trade):
+    faults = [{'match': 'kline', 'error': 503, 'times': 2}]
+    with replay.use_cassette(trade, TRADE_CASSETTE, faults=faults) as player, replay.scaled_sleep(0) as sleeps:
+        data = trade.fetch_ohlcv_with_retry('ETHUSDT', tf='15m')
+    assert len(data) == 100
+    assert player['faults'][0]['hits'] == 2
+    assert served(player) == ['kline']
+    # فقط backoff خود urllib3؛ حلقه retry ربات اجرا نشده است
+    assert sleeps['calls'] >= 1
+    assert sleeps['requested'] < 1 + 2
+
+
+def test_bot_gives_up_after_persistent_timeouts(trade):
+    faults = [{'match': 'kline', 'error': 'timeout'}]
+    with replay.use_cassette(trade, TRADE_CASSETTE, faults=faults) as player, replay.scaled_sleep(0) as sleeps:
+        assert trade.fetch_ohlcv_with_retry('ETHUSDT', max_retries=5, tf='15m') is None
+    # هر تلاش ربات = یک درخواست + ۳ retry در urllib3
+    assert player['faults'][0]['hits'] == 5 * 4
+    assert served(player) == []
+    assert sleeps['requested'] >= sum(2 ** i for i in range(5))
+
+
+def test_bot_retries_ccxt_timeouts(index):
+    pytest.importorskip('ccxt')
+    faults = [{'match': 'fetch_ohlcv', 'error': 'timeout', 'times': 2}]
+    with replay.use_cassette(index, INDEX_CASSETTE, faults=faults) as player, replay.scaled_sleep(0) as sleeps:
+        data = index.fetch_ohlcv_with_retry('ETH/USDT', tf='15m')
+    assert len(data) == 100
+    assert served(player) == ['fetch_ohlcv']
+    assert sleeps['calls'] == 2
+    assert sleeps['requested'] == 1 + 2
+
+
+def test_fault_does_not_consume_recorded_response():
+    pytest.importorskip('ccxt')
+    cassette = {'interactions': [
+        {'kind': 'ccxt', 'method': 'fetch_balance', 'request': {'args': [], 'kwargs': {}}, 'response': {'n': 1}},
+        {'kind': 'ccxt', 'method': 'fetch_balance', 'request': {'args': [], 'kwargs': {}}, 'response': {'n': 2}},
+    ]}
+    exchange = replay.ReplayExchange(replay.create_player(cassette, faults=[{'match': 'fetch_balance', 'error': 'timeout', 'times': 1}]))
+    with pytest.raises(Exception, match='Injected timeout'):
+        exchange.fetch_balance()
+    assert exchange.fetch_balance() == {'n': 1}
+    assert exchange.fetch_balance() == {'n': 2}
+
+
+def test_fallback_and_exact_match_share_positions():
+    pytest.importorskip('ccxt')
+    cassette = {'interactions': [
+        {'kind': 'ccxt', 'method': 'fetch_ticker', 'request': {'args': ['ETH'], 'kwargs': {}}, 'response': {'n': 1}},
+        {'kind': 'ccxt', 'method': 'fetch_ticker', 'request': {'args': ['ETH'], 'kwargs': {}}, 'response': {'n': 2}},
+    ]}
+    exchange = replay.ReplayExchange(replay.create_player(cassette))
+    assert exchange.fetch_ticker('BTC') == {'n': 1}
+    # پاسخی که از صف جایگزین مصرف شده دوباره برای درخواست دقیق پخش نمی‌شود
+    assert exchange.fetch_ticker('ETH') == {'n': 2}
+    assert exchange.fetch_ticker('ETH') == {'n': 2}
+
+
+def test_fault_on_unrecorded_endpoint_raises_fault():
+    pytest.importorskip('ccxt')
+    exchange = replay.ReplayExchange(replay.create_player({'interactions': []},
+                                                          faults=[{'match': 'fetch_ticker', 'error': 'rate_limit'}]))
+    with pytest.raises(Exception, match='Injected rate limit'):
+        exchange.fetch_ticker('ETHUSDT')
+    with pytest.raises(replay.ReplayMissError):
+        exchange.fetch_balance()
+
+
+def test_recording_redacts_secrets(tmp_path):
+    class FakeExchange:
+        def fetch_balance(self, params=None):
+            return {'info': {'apiKey': 'key-123', 'note': 'signed with secret-456'}, 'total': {'USDT': 5.0}}
+
+    class FakeBot:
+        exchange = FakeExchange()
+        api_key = 'key-123'
+        api_secret = 'secret-456'
+
+    path = tmp_path / 'recorded.json'
+    with replay.use_cassette(FakeBot, str(path), mode='record'):
+        assert FakeBot.exchange.fetch_balance()['total'] == {'USDT': 5.0}
+
+    text = path.read_text()
+    assert 'key-123' not in text and 'secret-456' not in text
+    interaction = json.loads(text)['interactions'][0]
+    assert interaction['response']['info'] == {'apiKey': replay.REDACTED, 'note': f'signed with {replay.REDACTED}'}
+    assert isinstance(FakeBot.exchange, FakeExchange)
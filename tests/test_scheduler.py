@@ -0,0 +1,176 @@
+import time
+import threading
+
+import pytest
+
+import scheduler
+
+
+@pytest.fixture
+def new_scheduler():
+    created = []
+
+    def factory(**kwargs):
+        sched = scheduler.create_scheduler(**kwargs)
+        created.append(sched)
+        return sched
+
+    yield factory
+    for sched in created:
+        sched['executor'].shutdown(wait=True)
+
+
+@pytest.fixture
+def make_job(new_scheduler, monkeypatch):
+    def factory(period=60, settle_offset=2.0, func=lambda: None, max_lateness=None):
+        sched = new_scheduler(max_workers=2)
+        monkeypatch.setitem(scheduler.TIMEFRAME_SECONDS, f'test-{period}', period)
+        job = scheduler.register_job(sched, 'job', f'test-{period}', func,
+                                     settle_offset=settle_offset, max_lateness=max_lateness)
+        return sched, job
+
+    return factory
+
+
+def test_timeframe_to_seconds_rejects_unknown():
+    assert scheduler.timeframe_to_seconds('15m') == 900
+    with pytest.raises(ValueError):
+        scheduler.timeframe_to_seconds('7m')
+
+
+def test_next_fire_time_is_candle_close_plus_settle_offset(make_job):
+    _, job = make_job(period=900, settle_offset=2.0)
+    assert job['period'] == 900
+    # وسط کندل: بسته شدن بعدی + تاخیر
+    assert scheduler.next_fire_time(job, 900 * 10 + 100) == 900 * 11 + 2.0
+    # درست بعد از بسته شدن ولی قبل از تاخیر: همین کندل
+    assert scheduler.next_fire_time(job, 900 * 10 + 1.0) == 900 * 10 + 2.0
+    # دقیقا روی زمان اجرا: کندل بعدی
+    assert scheduler.next_fire_time(job, 900 * 10 + 2.0) == 900 * 11 + 2.0
+
+
+def test_register_job_rejects_settle_offset_of_a_full_candle(new_scheduler):
+    sched = new_scheduler()
+    with pytest.raises(ValueError):
+        scheduler.register_job(sched, 'late', '1m', lambda: None, settle_offset=60)
+    with pytest.raises(ValueError):
+        scheduler.register_job(sched, 'negative', '1m', lambda: None, settle_offset=-1)
+
+
+def test_refresh_clock_offset_uses_server_time(new_scheduler):
+    sched = new_scheduler(server_time_fn=lambda: (time.time() + 1.5) * 1000)
+    offset = scheduler.refresh_clock_offset(sched)
+    assert offset == pytest.approx(1.5, abs=0.05)
+    assert scheduler.server_now(sched) - time.time() == pytest.approx(1.5, abs=0.05)
+
+
+def test_refresh_clock_offset_keeps_previous_offset_on_error(new_scheduler):
+    def broken():
+        raise RuntimeError('down')
+
+    sched = new_scheduler(server_time_fn=broken)
+    sched['clock_offset'] = 0.25
+    assert scheduler.refresh_clock_offset(sched) == 0.25
+
+
+def test_run_job_isolates_errors(make_job):
+    def boom():
+        raise RuntimeError('boom')
+
+    sched, job = make_job(func=boom)
+    job['running'] = True
+    sched['in_flight'] = 1
+    scheduler._run_job(sched, job, scheduler.server_now(sched))
+
+    metrics = scheduler.get_metrics(sched)['job']
+    assert metrics['errors'] == 1
+    assert metrics['runs'] == 1
+    assert metrics['missed_deadlines'] == 0
+    assert job['running'] is False
+    assert sched['in_flight'] == 0
+
+
+def test_run_job_counts_missed_deadline(make_job):
+    sched, job = make_job(max_lateness=1.0)
+    job['running'] = True
+    sched['in_flight'] = 1
+    scheduler._run_job(sched, job, scheduler.server_now(sched) - 5)
+    assert scheduler.get_metrics(sched)['job']['missed_deadlines'] == 1
+
+
+def test_dispatch_skips_while_previous_run_active(make_job):
+    release = threading.Event()
+    sched, job = make_job(func=release.wait)
+    job['next_run'] = scheduler.server_now(sched)
+
+    assert scheduler._dispatch(sched, job, job['next_run']) is True
+    assert scheduler._dispatch(sched, job, job['next_run']) is False
+    release.set()
+    sched['executor'].shutdown(wait=True)
+
+    metrics = scheduler.get_metrics(sched)['job']
+    assert metrics['skipped'] == 1
+    assert metrics['runs'] == 1
+    # رد شدن یک تیک به معنی از دست رفتن مهلت نیست
+    assert metrics['missed_deadlines'] == 0
+
+
+def test_dispatch_applies_backpressure_when_workers_busy(new_scheduler):
+    release = threading.Event()
+    sched = new_scheduler(max_workers=1)
+    first = scheduler.register_job(sched, 'first', '1m', release.wait)
+    second = scheduler.register_job(sched, 'second', '1m', lambda: None)
+    now = scheduler.server_now(sched)
+    first['next_run'] = second['next_run'] = now
+
+    assert scheduler._dispatch(sched, first, now) is True
+    assert scheduler._dispatch(sched, second, now) is False
+    release.set()
+    sched['executor'].shutdown(wait=True)
+    assert scheduler.get_metrics(sched)['second']['skipped'] == 1
+
+
+def test_run_scheduler_keeps_firing_after_errors(new_scheduler, monkeypatch):
+    calls = []
+
+    def flaky():
+        calls.append(time.time())
+        raise RuntimeError('flaky')
+
+    monkeypatch.setitem(scheduler.TIMEFRAME_SECONDS, 'test-0.2', 0.2)
+    sched = new_scheduler(max_workers=2)
+    scheduler.register_job(sched, 'flaky', 'test-0.2', flaky, settle_offset=0.0)
+    stop = threading.Event()
+    threading.Timer(1.0, stop.set).start()
+    scheduler.run_scheduler(sched, stop)
+
+    metrics = scheduler.get_metrics(sched)['flaky']
+    assert len(calls) >= 3
+    assert metrics['errors'] == metrics['runs'] == len(calls)
+
+
+def test_slow_clock_refresh_does_not_delay_ticks(new_scheduler, monkeypatch):
+    calls = []
+    release = threading.Event()
+    server_calls = []
+
+    def server_time():
+        server_calls.append(time.time())
+        # فقط همگام‌سازی اول سریع است؛ بقیه مثل درخواست معلق تا پایان تست گیر می‌کنند
+        if len(server_calls) > 1:
+            release.wait()
+        return time.time() * 1000
+
+    monkeypatch.setitem(scheduler.TIMEFRAME_SECONDS, 'test-0.2', 0.2)
+    sched = new_scheduler(server_time_fn=server_time, max_workers=2, drift_refresh=0.1)
+    scheduler.register_job(sched, 'tick', 'test-0.2', lambda: calls.append(time.time()), settle_offset=0.0)
+    stop = threading.Event()
+    threading.Timer(1.0, stop.set).start()
+    try:
+        scheduler.run_scheduler(sched, stop)
+    finally:
+        release.set()
+
+    assert len(calls) >= 4
+    # ترد همگام‌سازی معلق است، پس درخواست تکراری ساخته نمی‌شود
+    assert len(server_calls) == 2
@@ -0,0 +1,314 @@
+import sys
+import types
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+import supervisor
+from supervisor import COLUMNS, HEADER_FIELDS, publish_frames, read_frames, snapshot_is_valid
+
+
+def make_views(n_blocks):
+    header = np.zeros(HEADER_FIELDS + 2 * n_blocks, dtype=np.int64)
+    data = np.zeros((2, n_blocks, supervisor.CANDLE_LIMIT, len(COLUMNS)), dtype=np.float64)
+    return header, data
+
+
+def candles(timestamp, rows=5):
+    df = pd.DataFrame(np.zeros((rows, len(COLUMNS))), columns=COLUMNS)
+    df['timestamp'] = [timestamp - (rows - 1 - i) * 60 for i in range(rows)]
+    df['close'] = float(timestamp)
+    return df
+
+
+class ProbeFrame:
+    """Frame that checks a reader's snapshot while the writer is copying it."""
+
+    def __init__(self, df, header, seq):
+        self.df, self.header, self.seq = df, header, seq
+        self.valid_during_write = None
+
+    def __getitem__(self, columns):
+        return self
+
+    def to_numpy(self, dtype=None):
+        self.valid_during_write = snapshot_is_valid(self.header, self.seq)
+        return self.df[COLUMNS].to_numpy(dtype=dtype)
+
+
+def test_publish_then_read_round_trip():
+    header, data = make_views(2)
+    lock = threading.Lock()
+    assert publish_frames(header, data, {0: candles(1000), 1: candles(2000)}, lock) == 1
+
+    seq, frames = read_frames(header, data, {'A': 0, 'B': 1})
+    assert seq == 1
+    assert frames['A']['timestamp'].iloc[-1] == 1000
+    assert frames['B']['close'].iloc[-1] == 2000
+    assert snapshot_is_valid(header, seq)
+
+
+def test_interleaved_publishes_invalidate_snapshot():
+    header, data = make_views(1)
+    lock = threading.Lock()
+    publish_frames(header, data, {0: candles(1000)}, lock)
+    seq, frames = read_frames(header, data, {'A': 0})
+
+    # اولین انتشار در بافر دیگر نوشته می‌شود و snapshot هنوز معتبر است
+    first = ProbeFrame(candles(2000), header, seq)
+    publish_frames(header, data, {0: first}, lock)
+    assert first.valid_during_write
+    assert snapshot_is_valid(header, seq)
+    assert frames['A']['close'].iloc[-1] == 1000
+
+    # دومین انتشار بافر خواننده را بازنویسی می‌کند؛ قبل از تغییر seq باید رد شود
+    second = ProbeFrame(candles(3000), header, seq)
+    publish_frames(header, data, {0: second}, lock)
+    assert second.valid_during_write is False
+    assert not snapshot_is_valid(header, seq)
+
+
+def test_stale_block_is_not_republished():
+    header, data = make_views(2)
+    lock = threading.Lock()
+    publish_frames(header, data, {0: candles(1000), 1: candles(1000)}, lock)
+    publish_frames(header, data, {1: candles(2000)}, lock, stale_blocks=[0])
+
+    seq, frames = read_frames(header, data, {'A': 0, 'B': 1})
+    assert list(frames) == ['B']
+    assert frames['B']['timestamp'].iloc[-1] == 2000
+
+    # بلوکی که در این چرخه دریافت شود دوباره منتشر می‌شود
+    publish_frames(header, data, {0: candles(3000), 1: candles(3000)}, lock)
+    assert sorted(read_frames(header, data, {'A': 0, 'B': 1})[1]) == ['A', 'B']
+
+
+def test_publish_group_marks_failed_fetches_stale():
+    header, data = make_views(2)
+    lock = threading.Lock()
+    layout = [('15m', 'ETHUSDT'), ('15m', 'BTCUSDT')]
+    group = {'name': 'main', 'timeframe': '15m', 'symbols': ['ETHUSDT', 'BTCUSDT']}
+    publish_frames(header, data, {0: candles(1000), 1: candles(1000)}, lock)
+
+    bot = types.SimpleNamespace(
+        fetch_candles=lambda symbol, tf: candles(2000) if symbol == 'BTCUSDT' else None,
+        compute_indicators=lambda df: df,
+    )
+    supervisor.publish_group(bot, group, header, data, layout, lock)
+
+    frames = read_frames(header, data, supervisor.group_blocks(group, layout))[1]
+    assert list(frames) == ['BTCUSDT']
+
+
+def test_market_data_connects_with_account_keys(monkeypatch):
+    connected = []
+
+    class Connected(Exception):
+        pass
+
+    def connect(key, secret):
+        connected.append((key, secret))
+        raise Connected()
+
+    bot = types.ModuleType('fake_market_bot')
+    bot.configure = lambda config: None
+    bot.connect = connect
+    bot.init = lambda config: pytest.fail('init requires the default API_KEY')
+    monkeypatch.setitem(sys.modules, 'fake_market_bot', bot)
+    monkeypatch.setattr(supervisor, 'bot_module_name', lambda config: 'fake_market_bot')
+    monkeypatch.setattr(supervisor, 'setup_logging', lambda config: None)
+
+    account = {'name': 'alice', 'api_key': 'alice-key', 'api_secret': 'alice-secret'}
+    with pytest.raises(Connected):
+        supervisor.market_data_main({}, account, 'unused', [])
+    assert connected == [('alice-key', 'alice-secret')]
+
+
+def test_load_accounts_requires_default_keys(monkeypatch):
+    monkeypatch.delenv('ACCOUNTS', raising=False)
+    monkeypatch.setenv('API_KEY', 'key')
+    monkeypatch.delenv('API_SECRET', raising=False)
+    with pytest.raises(ValueError, match='account default'):
+        supervisor.load_accounts()
+
+    monkeypatch.setenv('API_SECRET', 'secret')
+    assert supervisor.load_accounts() == [{'name': 'default', 'api_key': 'key', 'api_secret': 'secret'}]
+
+
+def test_load_accounts_requires_named_keys(monkeypatch):
+    monkeypatch.setenv('ACCOUNTS', 'alice, bob')
+    monkeypatch.setenv('ALICE_API_KEY', 'a-key')
+    monkeypatch.setenv('ALICE_API_SECRET', 'a-secret')
+    monkeypatch.delenv('BOB_API_KEY', raising=False)
+    with pytest.raises(ValueError, match='account bob'):
+        supervisor.load_accounts()
+
+
+class FakeProcess:
+    def __init__(self):
+        self.alive = True
+        self.exitcode = None
+        self.pid = 1234
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return self.alive
+
+    def crash(self, code=1):
+        self.alive, self.exitcode = False, code
+
+
+class FakeContext:
+    def __init__(self):
+        self.started = []
+
+    def Process(self, target, args, name, daemon):
+        process = FakeProcess()
+        self.started.append(process)
+        return process
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {'t': 1000.0}
+    monkeypatch.setattr(supervisor, 'time', types.SimpleNamespace(time=lambda: now['t'], sleep=lambda s: None))
+    return now
+
+
+def make_spec():
+    return {'name': 'account-alice', 'target': None, 'args': (), 'process': None,
+            'restarts': 0, 'started': 0.0, 'next_start': 0.0}
+
+
+def test_check_process_restarts_with_exponential_backoff(clock):
+    ctx, spec = FakeContext(), make_spec()
+    supervisor.check_process(ctx, spec)
+    assert len(ctx.started) == 1
+
+    for restarts, delay in enumerate([1, 2, 4, 8], start=1):
+        spec['process'].crash()
+        supervisor.check_process(ctx, spec)
+        assert spec['restarts'] == restarts
+        assert spec['process'] is None
+        assert spec['next_start'] == clock['t'] + delay
+
+        clock['t'] += delay - 0.5
+        supervisor.check_process(ctx, spec)
+        assert len(ctx.started) == restarts
+
+        clock['t'] += 0.5
+        supervisor.check_process(ctx, spec)
+        assert len(ctx.started) == restarts + 1
+
+
+def test_check_process_caps_restart_delay(clock):
+    ctx, spec = FakeContext(), make_spec()
+    supervisor.check_process(ctx, spec)
+    spec['restarts'] = 20
+    spec['process'].crash()
+    supervisor.check_process(ctx, spec)
+    assert spec['next_start'] == clock['t'] + supervisor.MAX_RESTART_DELAY
+
+
+def test_check_process_resets_backoff_after_stable_run(clock):
+    ctx, spec = FakeContext(), make_spec()
+    supervisor.check_process(ctx, spec)
+    spec['restarts'] = 3
+
+    clock['t'] += supervisor.STABLE_RUN_SECONDS
+    supervisor.check_process(ctx, spec)
+    assert spec['restarts'] == 3
+
+    clock['t'] += 1
+    supervisor.check_process(ctx, spec)
+    assert spec['restarts'] == 0
+    assert len(ctx.started) == 1
+
+
+@pytest.fixture
+def market(monkeypatch):
+    shm = supervisor.shared_memory.SharedMemory(create=True, size=supervisor.shared_memory_size(1))
+    views = {'layout': [('15m', 'ETHUSDT')]}
+    views['header'], views['data'] = supervisor.attach_views(shm, 1)
+    views['header'][:] = 0
+    views['shm_name'] = shm.name
+    yield views
+    views.clear()
+    shm.close()
+    shm.unlink()
+
+
+def run_worker(monkeypatch, market, select_best_signals, on_sleep):
+    """Run account_worker_main with a stub bot until on_sleep returns False."""
+    placed = []
+    bot = types.ModuleType('fake_worker_bot')
+    bot.schedule = [{'name': 'eth', 'timeframe': '15m', 'symbols': ['ETHUSDT']}]
+    bot.configure = lambda config: None
+    bot.connect = lambda key, secret: None
+    bot.setup_account = lambda: True
+    bot.select_best_signals = select_best_signals
+    bot.place_signals = lambda signals, tf: placed.append((signals, tf))
+    monkeypatch.setitem(sys.modules, 'fake_worker_bot', bot)
+    monkeypatch.setattr(supervisor, 'bot_module_name', lambda config: 'fake_worker_bot')
+    monkeypatch.setattr(supervisor, 'setup_logging', lambda config: None)
+
+    def sleep(seconds):
+        if not on_sleep():
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(supervisor, 'time', types.SimpleNamespace(time=lambda: 0.0, sleep=sleep))
+    account = {'name': 'alice', 'api_key': 'k', 'api_secret': 's'}
+    supervisor.account_worker_main({}, account, market['shm_name'], market['layout'], 0.01)
+    return placed
+
+
+def test_worker_skips_candles_published_before_start(monkeypatch, market):
+    lock = threading.Lock()
+    publish_frames(market['header'], market['data'], {0: candles(1000)}, lock)
+    seen = []
+    # کندل قدیمی دوباره منتشر می‌شود و سپس یک کندل جدید
+    steps = [lambda: publish_frames(market['header'], market['data'], {0: candles(1000)}, lock),
+             lambda: publish_frames(market['header'], market['data'], {0: candles(2000)}, lock)]
+
+    def select_best_signals(group_symbols, tf, frames):
+        seen.append(int(frames['ETHUSDT']['timestamp'].iloc[-1]))
+        return [{'symbol': 'ETHUSDT', 'signal': 'buy'}]
+
+    def on_sleep():
+        if not steps:
+            return False
+        steps.pop(0)()
+        return True
+
+    placed = run_worker(monkeypatch, market, select_best_signals, on_sleep)
+    assert seen == [2000]
+    assert placed == [([{'symbol': 'ETHUSDT', 'signal': 'buy'}], '15m')]
+
+
+def test_worker_retries_when_snapshot_changes_while_reading(monkeypatch, market):
+    lock = threading.Lock()
+    seen = []
+    steps = [lambda: publish_frames(market['header'], market['data'], {0: candles(1000)}, lock)]
+
+    def select_best_signals(group_symbols, tf, frames):
+        seen.append(int(frames['ETHUSDT']['timestamp'].iloc[-1]))
+        if len(seen) == 1:
+            # نویسنده در حین خواندن دو بار منتشر می‌کند و بافر خواننده بازنویسی می‌شود
+            publish_frames(market['header'], market['data'], {0: candles(2000)}, lock)
+            publish_frames(market['header'], market['data'], {0: candles(3000)}, lock)
+        return [{'symbol': 'ETHUSDT', 'signal': 'sell', 'candle': seen[-1]}]
+
+    def on_sleep():
+        if not steps:
+            return False
+        steps.pop(0)()
+        return True
+
+    placed = run_worker(monkeypatch, market, select_best_signals, on_sleep)
+    assert seen == [1000, 3000]
+    assert placed == [([{'symbol': 'ETHUSDT', 'signal': 'sell', 'candle': 3000}], '15m')]
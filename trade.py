@@ -1,67 +1,105 @@
-import ccxt
 import time
-import pandas as pd
-from ta.trend import EMAIndicator, ADXIndicator
-from ta.momentum import RSIIndicator
-from ta.volatility import AverageTrueRange
 import logging
+import threading
 import os
-from dotenv import load_dotenv
-import requests
 import hmac
 import hashlib
 import json
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-# تنظیمات لاگ
-logging.basicConfig(
-    filename='trading_bot_detailed.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# بارگذاری API Key
-load_dotenv()
-api_key = os.getenv('API_KEY')
-api_secret = os.getenv('API_SECRET')
-if not api_key or not api_secret:
-    logging.error("API key or secret not found")
-    raise ValueError("API key or secret not found")
+from scheduler import create_scheduler, register_job, run_scheduler
+from config import load_config, setup_logging, DEFAULT_CONFIG_PATHS
 
-# تنظیمات صرافی Bybit Demo
-exchange = ccxt.bybit({
-    'apiKey': api_key,
-    'secret': api_secret,
-    'enableRateLimit': True,
-    'urls': {
-        'https://api-demo.bybit.com',
-    },
-    'options': {
-        'defaultType': 'linear',
-        'adjustForTimeDifference': True,
-    },
-})
-
-symbols = ['ETHUSDT']
+# ccxt، requests، pandas و ta سنگین هستند و فقط هنگام نیاز بارگذاری می‌شوند.
+# مقادیر زیر توسط configure() و connect() پر می‌شوند.
+api_key = None
+api_secret = None
+exchange = None
+
+symbols = []
 timeframe = '15m'
 base_risk_percent = 0.20
 leverage = 5
 max_open_positions = 2
 position_value = 20
-min_order_sizes = {
-    'ETHUSDT': 0.004,
+min_order_sizes = {}
+schedule = []
+settle_offset = 2.0  # ثانیه بعد از بسته شدن کندل
+max_concurrent_jobs = 4
+order_lock = threading.Lock()
+# فرمت interval در API کندل Bybit
+bybit_intervals = {
+    '1m': '1', '3m': '3', '5m': '5', '15m': '15', '30m': '30',
+    '1h': '60', '2h': '120', '4h': '240', '6h': '360', '12h': '720', '1d': 'D',
 }
 
+def configure(config):
+    global symbols, timeframe, base_risk_percent, leverage, max_open_positions, position_value
+    global min_order_sizes, schedule, settle_offset, max_concurrent_jobs
+    symbols = list(config['symbols'])
+    timeframe = config['timeframe']
+    base_risk_percent = config['base_risk_percent']
+    leverage = config['leverage']
+    max_open_positions = config['max_open_positions']
+    position_value = config['position_value']
+    min_order_sizes = dict(config['min_order_sizes'])
+    schedule = [dict(group) for group in config['schedule']]
+    settle_offset = config['settle_offset']
+    max_concurrent_jobs = config['max_concurrent_jobs']
+
+# تنظیمات صرافی Bybit Demo
+def create_exchange(key, secret):
+    import ccxt
+
+    return ccxt.bybit({
+        'apiKey': key,
+        'secret': secret,
+        'enableRateLimit': True,
+        'urls': {
+            'https://api-demo.bybit.com',
+        },
+        'options': {
+            'defaultType': 'linear',
+            'adjustForTimeDifference': True,
+        },
+    })
+
+def connect(key, secret):
+    global api_key, api_secret, exchange
+    api_key = key
+    api_secret = secret
+    exchange = create_exchange(key, secret)
+
+def init(config):
+    setup_logging(config)
+    configure(config)
+
+    # بارگذاری API Key
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    key = os.getenv('API_KEY')
+    secret = os.getenv('API_SECRET')
+    if not key or not secret:
+        logging.error("API key or secret not found")
+        raise ValueError("API key or secret not found")
+    connect(key, secret)
+
 def generate_signature(timestamp, recv_window, payload):
     param_str = f"{timestamp}{api_key}{recv_window}{payload}"
     return hmac.new(api_secret.encode('utf-8'), param_str.encode('utf-8'), hashlib.sha256).hexdigest()
 
+def create_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
+    session.mount('https://', HTTPAdapter(max_retries=retries))
+    return session
+
 def set_leverage_with_requests(symbol):
     try:
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        session = create_session()
 
         url = 'https://api-demo.bybit.com/v5/position/set-leverage'
         timestamp = str(int(time.time() * 1000))
@@ -95,9 +133,7 @@ def set_leverage_with_requests(symbol):
 
 def request_demo_funds_with_requests():
     try:
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        session = create_session()
 
         url = 'https://api-demo.bybit.com/v5/account/demo-apply-money'
         timestamp = str(int(time.time() * 1000))
@@ -128,17 +164,16 @@ def request_demo_funds_with_requests():
     except Exception as e:
         logging.error(f"[FUNDS] Error requesting demo funds: {str(e)}")
 
-def fetch_ohlcv_with_retry(symbol, max_retries=5):
+def fetch_ohlcv_with_retry(symbol, max_retries=5, tf=None):
+    interval = bybit_intervals.get(tf or timeframe, tf or timeframe)
     for i in range(max_retries):
         try:
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
-            session.mount('https://', HTTPAdapter(max_retries=retries))
+            session = create_session()
 
             url = 'https://api-demo.bybit.com/v5/market/kline'
             timestamp = str(int(time.time() * 1000))
             recv_window = '5000'
-            params = f"category=linear&symbol={symbol}&interval={timeframe}&limit=100"
+            params = f"category=linear&symbol={symbol}&interval={interval}&limit=100"
             signature = generate_signature(timestamp, recv_window, params)
 
             headers = {
@@ -151,7 +186,7 @@ def fetch_ohlcv_with_retry(symbol, max_retries=5):
             response = session.get(url, headers=headers, params={
                 'category': 'linear',
                 'symbol': symbol,
-                'interval': timeframe,
+                'interval': interval,
                 'limit': '100'
             })
 
@@ -166,6 +201,8 @@ def fetch_ohlcv_with_retry(symbol, max_retries=5):
             candles = response_json['result']['list']
             # تبدیل داده‌ها به فرمت CCXT: [timestamp, open, high, low, close, volume]
             data = [[int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])] for c in candles]
+            # بای‌بیت کندل‌ها را از جدید به قدیم برمی‌گرداند؛ اندیکاتورها ترتیب زمانی صعودی لازم دارند
+            data.sort(key=lambda c: c[0])
             logging.info(f"[OHLCV] Fetched OHLCV for {symbol}: {len(data)} candles")
             return data
         except Exception as e:
@@ -191,12 +228,22 @@ def adjust_risk_percent(atr, adx, price, symbol, base_risk=0.20):
     logging.info(f"[RISK] Adjusted risk: {risk*100:.1f}% (ATR: {atr:.2f}, ADX: {adx:.2f})")
     return risk
 
-def generate_signal(df, symbol):
+def compute_indicators(df):
+    from ta.trend import EMAIndicator, ADXIndicator
+    from ta.momentum import RSIIndicator
+    from ta.volatility import AverageTrueRange
+
     df['ema_short'] = EMAIndicator(df['close'], window=12).ema_indicator()
     df['ema_long'] = EMAIndicator(df['close'], window=26).ema_indicator()
     df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
     df['adx'] = ADXIndicator(df['high'], df['low'], df['close'], window=14).adx()
     df['atr'] = AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range()
+    return df
+
+def generate_signal(df, symbol):
+    # اندیکاتورها ممکن است قبلا توسط فرایند داده بازار محاسبه شده باشند
+    if 'atr' not in df.columns:
+        compute_indicators(df)
 
     last = df.iloc[-1]
     prev = df.iloc[-2]
@@ -285,7 +332,7 @@ def place_order(symbol, signal, price, atr, adx, support, resistance):
                 return None
 
     balance = get_balance()
-    risk_percent = adjust_risk_percent(atr, adx, price, symbol)
+    risk_percent = adjust_risk_percent(atr, adx, price, symbol, base_risk=base_risk_percent)
     if balance < risk_percent * 20:
         logging.error(f"[ORDER] Insufficient balance for {symbol}: {balance:.2f} USDT")
         return None
@@ -327,15 +374,22 @@ def place_order(symbol, signal, price, atr, adx, support, resistance):
         logging.error(f"[ORDER] Failed to place order for {symbol}: {str(e)}")
         return None
 
-def select_best_signals():
+def fetch_candles(symbol, tf=None):
+    ohlcv = fetch_ohlcv_with_retry(symbol, tf=tf)
+    if ohlcv is None:
+        return None
+    import pandas as pd
+
+    return pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+def select_best_signals(group_symbols=None, tf=None, frames=None):
     signals = []
-    for symbol in symbols:
+    for symbol in group_symbols or symbols:
         try:
-            ohlcv = fetch_ohlcv_with_retry(symbol)
-            if ohlcv is None:
+            df = frames.get(symbol) if frames is not None else fetch_candles(symbol, tf)
+            if df is None:
                 continue
 
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             signal_data = generate_signal(df, symbol)
             if signal_data:
                 signal_data['symbol'] = symbol
@@ -347,42 +401,48 @@ def select_best_signals():
     signals.sort(key=lambda x: (-x['adx'], x['atr'] / x['price']))
     return signals[:max_open_positions]
 
-def sync_with_candle():
-    current_time = time.time()
-    candle_duration = 15 * 60
-    sleep_time = candle_duration - (current_time % candle_duration)
-    logging.info(f"[SYNC] Waiting {sleep_time:.0f}s for next candle")
-    time.sleep(sleep_time)
-
-def run_bot():
+def run_cycle(group_symbols, tf, frames=None):
+    best_signals = select_best_signals(group_symbols, tf, frames)
+    if not best_signals:
+        logging.info(f"[WAITING] No valid signals for any symbol ({tf}).")
+        return
+    place_signals(best_signals, tf)
+
+def place_signals(best_signals, tf):
+    with order_lock:
+        for signal_data in best_signals:
+            symbol = signal_data['symbol']
+            signal = signal_data['signal']
+            price = signal_data['price']
+            atr = signal_data['atr']
+            adx = signal_data['adx']
+            support = signal_data['support']
+            resistance = signal_data['resistance']
+
+            logging.info(f"[SIGNAL] {signal.upper()} for {symbol} at {price:.2f} ({tf}, ADX: {adx:.2f}, ATR: {atr:.2f})")
+            place_order(symbol, signal, price, atr, adx, support, resistance)
+
+def setup_account():
     for symbol in symbols:
         set_leverage_with_requests(symbol)
 
     request_demo_funds_with_requests()
+    return True
 
-    while True:
-        sync_with_candle()
-        try:
-            best_signals = select_best_signals()
-            if not best_signals:
-                logging.info("[WAITING] No valid signals for any symbol.")
-                continue
-
-            for signal_data in best_signals:
-                symbol = signal_data['symbol']
-                signal = signal_data['signal']
-                price = signal_data['price']
-                atr = signal_data['atr']
-                adx = signal_data['adx']
-                support = signal_data['support']
-                resistance = signal_data['resistance']
-
-                logging.info(f"[SIGNAL] {signal.upper()} for {symbol} at {price:.2f} (ADX: {adx:.2f}, ATR: {atr:.2f})")
-                place_order(symbol, signal, price, atr, adx, support, resistance)
-
-        except Exception as e:
-            logging.error(f"[ERROR] Main loop: {str(e)}")
-            time.sleep(60)
+def run_bot():
+    setup_account()
+
+    scheduler = create_scheduler(server_time_fn=exchange.fetch_time, max_workers=max_concurrent_jobs)
+    for group in schedule:
+        register_job(
+            scheduler,
+            f"{group['name']}-{group['timeframe']}",
+            group['timeframe'],
+            lambda group=group: run_cycle(group['symbols'], group['timeframe']),
+            settle_offset=settle_offset,
+        )
+    run_scheduler(scheduler)
 
 if __name__ == "__main__":
+    init(load_config(DEFAULT_CONFIG_PATHS['trade']))
     run_bot()
\ No newline at end of file